@@ -4,8 +4,12 @@ A minimal live CTA data-collector & LLM prompter for digital tasks.
 Author: (c) 2025 – MIT-style license
 """
 
-import os, time, json, queue, threading
+import os, io, time, json, threading, bisect
+from collections import deque
 from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
 
 from openai import OpenAI
 import psutil
@@ -28,43 +32,90 @@ client = OpenAI()  # automatically picks up OPENAI_API_KEY
 
 # ──────────────────────────  SENSORS  ────────────────────────── #
 class TelemetryBuffer:
-    """Thread-safe circular buffer of (timestamp, event_str)."""
+    """Thread-safe circular buffer of (timestamp, event_str).
+    Lock-free: single-item deque.append and list(deque) are atomic under
+    the GIL. snapshot() bisects the (ascending) timestamps of a copy
+    instead of filtering every entry.
+    Also keeps rolling per-type state for the trigger heuristics."""
     def __init__(self, maxlen=500):
         self.maxlen = maxlen
-        self.buf   = queue.deque(maxlen=maxlen)
-        self.lock  = threading.Lock()
+        self.buf   = deque(maxlen=maxlen)
+        self.last_input_ts  = 0                     # last [key]/[mouse] event
+        self.recent_file_ts = deque(maxlen=maxlen)  # [file+] event times; consumer prunes
 
     def add(self, ev):
-        with self.lock:
-            self.buf.append((time.time(), ev))
+        now = time.time()
+        self.buf.append((now, ev))
+        if ev.startswith(("[key]", "[mouse]")):
+            self.last_input_ts = now
+        elif ev.startswith("[file+]"):
+            self.recent_file_ts.append(now)
 
     def snapshot(self, last_n_secs=60):
         cutoff = time.time() - last_n_secs
-        with self.lock:
-            return [f"{datetime.fromtimestamp(ts).isoformat()}  {txt}"
-                    for ts, txt in self.buf if ts >= cutoff]
+        items = list(self.buf)
+        idx = bisect.bisect_left(items, (cutoff,))   # first entry with ts >= cutoff
+        return [f"{datetime.fromtimestamp(ts).isoformat()}  {txt}"
+                for ts, txt in items[idx:]]
 
-# Active window title every second (cross-platform)
-def poll_active_window(telemetry, stop_event):
-    import platform, subprocess, re
-    while not stop_event.is_set():
+# Active-window title reader for this platform (native APIs, no per-call fork where available)
+# Returns (read, close); call close() when done to release any native connection
+def active_window_reader():
+    import platform, subprocess
+    no_close = lambda: None
+    if platform.system() == "Windows":
+        import win32gui
+        return (lambda: win32gui.GetWindowText(win32gui.GetForegroundWindow())), no_close
+    elif platform.system() == "Darwin":
+        try:
+            from AppKit import NSWorkspace   # pyobjc
+            ws = NSWorkspace.sharedWorkspace()
+            return (lambda: str(ws.frontmostApplication().localizedName())), no_close
+        except ImportError:
+            return (lambda: subprocess.check_output(
+                ["osascript","-e",'tell app "System Events" to get name of (process 1 where frontmost is true)']
+            ).decode().strip()), no_close
+    else:   # Linux (X)
         try:
-            if platform.system() == "Windows":
-                import ctypes, win32gui
-                hwnd = win32gui.GetForegroundWindow()
-                title = win32gui.GetWindowText(hwnd)
-            elif platform.system() == "Darwin":
-                title = subprocess.check_output(
-                    ["osascript","-e",'tell app "System Events" to get name of (process 1 where frontmost is true)']
-                ).decode().strip()
-            else:   # Linux (X)
-                title = subprocess.check_output(
-                    ["xdotool","getactivewindow","getwindowname"]
-                ).decode().strip()
-            telemetry.add(f"[win] {title}")
-        except Exception as e:
-            telemetry.add(f"[win] ERROR {e}")
-        time.sleep(1)
+            from Xlib import X, display   # python-xlib
+        except ImportError:
+            return (lambda: subprocess.check_output(
+                ["xdotool","getactivewindow","getwindowname"]
+            ).decode().strip()), no_close
+        d = display.Display()   # kept open until close()
+        try:
+            root = d.screen().root
+            NET_ACTIVE_WINDOW = d.intern_atom("_NET_ACTIVE_WINDOW")
+            NET_WM_NAME = d.intern_atom("_NET_WM_NAME")
+        except Exception:
+            d.close(); raise
+        def read():
+            wid = root.get_full_property(NET_ACTIVE_WINDOW, X.AnyPropertyType).value[0]
+            win = d.create_resource_object("window", wid)
+            name = win.get_full_property(NET_WM_NAME, X.AnyPropertyType)
+            if name is not None:
+                return name.value.decode("utf8", "replace") if isinstance(name.value, bytes) else str(name.value)
+            return win.get_wm_name() or ""
+        return read, d.close
+
+# Active window title every second (cross-platform); logged only when it changes
+def poll_active_window(telemetry, stop_event):
+    try:
+        read_title, close = active_window_reader()
+    except Exception as e:
+        telemetry.add(f"[win] ERROR {e}"); return
+    last = None
+    try:
+        while not stop_event.is_set():
+            try:
+                ev = f"[win] {read_title()}"
+            except Exception as e:
+                ev = f"[win] ERROR {e}"
+            if ev != last:
+                telemetry.add(ev); last = ev
+            stop_event.wait(1)   # sleeps, but wakes immediately on stop
+    finally:
+        close()
 
 # Keyboard / mouse hooks
 def hook_input(telemetry, stop_event):
@@ -74,8 +125,7 @@ def hook_input(telemetry, stop_event):
         if pressed: telemetry.add(f"[mouse] {button} at {x},{y}")
     with keyboard.Listener(on_press=on_press) as kl, \
          mouse.Listener(on_click=on_click) as ml:
-        while not stop_event.is_set():
-            time.sleep(0.1)
+        stop_event.wait()   # block until stop; listeners run on their own threads
 
 # File system watcher (current working directory recursive)
 class FSHandler(FileSystemEventHandler):
@@ -86,68 +136,193 @@ class FSHandler(FileSystemEventHandler):
 def watch_fs(path, telemetry, stop_event):
     handler = FSHandler(telemetry)
     obs = Observer(); obs.schedule(handler, path, recursive=True); obs.start()
-    while not stop_event.is_set(): time.sleep(0.5)
+    stop_event.wait()   # block until stop; the observer runs on its own thread
     obs.stop(); obs.join()
 
 # ───────────────────────  RULE ENGINE  ───────────────────────── #
 class TriggerEngine:
-    """Very simple heuristics; replace with ML / rules as desired."""
+    """Very simple heuristics; replace with ML / rules as desired.
+    Reads TelemetryBuffer's rolling state instead of scanning the buffer."""
     def __init__(self):
         self.last_prompt = 0
-        self.file_events = []
 
     def evaluate(self, telemetry):
         now = time.time()
         # 1) idle pause ≥ 5 s (no key or mouse event)
-        recent = telemetry.snapshot(6)
-        any_input = any(ev.startswith("[key]") or ev.startswith("[mouse]")
-                        for ev in recent)
-        if not any_input and now - self.last_prompt > 15:
+        if now - telemetry.last_input_ts > 6 and now - self.last_prompt > 15:
             return "I noticed a short pause—what were you thinking through just now?"
 
         # 2) burst of ≥3 file opens in 30 s
-        self.file_events = [ts for ts in self.file_events if now - ts < 30]
-        self.file_events += [now] if any(ev.startswith("[file+]") for ev in recent) else []
-        if len(self.file_events) >= 3 and now - self.last_prompt > 30:
+        file_ts = telemetry.recent_file_ts
+        while file_ts and now - file_ts[0] >= 30:
+            file_ts.popleft()
+        if len(file_ts) >= 3 and now - self.last_prompt > 30:
             return "You opened several new files—how did you choose which ones mattered?"
 
         return None
 
 # ────────────────────  LLM & AUDIO HELPERS  ──────────────────── #
+# Static system prompt. Kept byte-identical across calls and longer than
+# OpenAI's 1024-token prompt-caching threshold, so the prefix is cached server-side;
+# only the trailing user message (raw context + focus hint) changes per call.
+CTA_SYSTEM_PROMPT = """\
+You are an expert CTA interviewer. Ask ONE concise question to reveal the user's hidden cues/decision-making, given context.
+
+## Setting
+Cognitive Task Analysis (CTA) elicits the knowledge experts use but rarely state: the cues they notice, the goals they juggle, the options they weigh, the expectancies they form and the rules of thumb they apply. You are embedded in a live recording session. While the user works on a digital task, a background recorder collects telemetry from their computer. From time to time a simple heuristic decides that a moment is worth probing (for example a pause or a burst of file activity) and asks you for a single question. The user will see your question in a small dialog box and may answer it aloud; the answer is recorded and transcribed. Interruptions are costly, so every question must earn its place.
+
+## Input format
+Each request is one user message containing:
+1. Context (last 60 s, most recent last): one telemetry line per event, formatted as
+   "<ISO-8601 timestamp>  <event>". Event types:
+   - "[win] <title>"   the foreground window or application changed to <title>
+   - "[key] <key>"     a key was pressed (single characters, or names such as Key.enter, Key.backspace, Key.ctrl_l)
+   - "[mouse] <button> at <x>,<y>"  a mouse button was pressed at screen coordinates
+   - "[file+] <path>"  a file was created under the working directory
+   - "[file~] <path>"  a file was modified under the working directory
+   - "[win] ERROR ..." the window title could not be read; ignore these lines
+2. A blank line.
+3. "Suggested focus: <hint>", a short note from the trigger heuristic describing why this moment was selected. Treat it as a hint about the moment, not as wording to copy.
+
+Keystrokes are individual events, so typed text appears as a sequence of [key] lines; reconstruct words or commands when it helps you understand what the user was doing. Paths and window titles usually reveal the tool and the artefact being worked on. The context may be empty or very short; in that case rely on the focus hint.
+
+## How to choose the question
+- Anchor the question in something concrete from the context: a specific file, window, command, edit, or the timing of a pause. Name it briefly so the user knows which moment you mean.
+- Probe the reasoning behind the action, not the action itself. The recorder already knows what happened; ask why, what was noticed, what was expected, or what alternatives were considered.
+- Prefer Critical Decision Method probes:
+  - Cues: "What did you notice in ... that told you ...?"
+  - Goals: "What were you trying to achieve when you ...?"
+  - Options: "What else did you consider before choosing ...?"
+  - Expectancies: "What did you expect to happen when you ...?"
+  - Experience: "What past situation did ... remind you of?"
+  - Anomalies: "What looked wrong or surprising about ...?"
+  - Novice contrast: "What might someone new to this have missed at this point?"
+- After a pause, ask what the user was thinking through, checking, or deciding during it.
+- After switching between windows or opening several files, ask how they decided what to look at and what they were looking for.
+- After a burst of edits or deletions, ask what prompted the change.
+
+## Interpreting common patterns
+- Rapid alternation between two windows usually means comparing or copying information between them; ask what was being compared.
+- Many Key.backspace events followed by new typing suggest reformulation; ask what made the first version unsatisfactory.
+- Repeated modifications of the same file within seconds usually come from saving while iterating; ask what the user was testing or verifying.
+- Files created by tools (caches, build output, temporary or lock files) are rarely deliberate choices; focus on the files the user is evidently working with.
+- A pause right after a new window appears often means reading; ask what the user was looking for in it.
+
+## Rules for the output
+- Output exactly ONE question and nothing else: no preamble, no numbering, no quotation marks, no explanation.
+- At most 30 words; a single sentence ending with a question mark.
+- Open-ended: never a yes/no question, never a multiple-choice list.
+- Neutral and non-judgemental: do not imply the user made a mistake or was slow.
+- Do not mention telemetry, logging, keystrokes, timestamps, or that the user is being recorded.
+- Do not quote passwords, tokens, personal data, or long stretches of typed text; refer to them generically ("the value you typed").
+- Plain everyday language; avoid CTA jargon such as "cue" or "expectancy" unless the user's own work uses it.
+- If the context gives nothing concrete, ask a general question about what the user is currently deciding or paying attention to.
+
+## Examples
+Context shows the user editing report_draft.docx, then switching to a browser window titled "Quarterly sales - Dashboard", then a 7-second pause.
+Suggested focus: I noticed a short pause—what were you thinking through just now?
+Good question: What were you checking on the sales dashboard before going back to the report draft?
+
+Context shows three new files created in quick succession: data/raw_2024.csv, data/raw_2023.csv, notebooks/clean.ipynb.
+Suggested focus: You opened several new files—how did you choose which ones mattered?
+Good question: How did you decide to start with the 2024 and 2023 raw files for the cleaning notebook?
+
+Context shows the user typing a long terminal command, pressing Key.enter, then a pause with no input.
+Suggested focus: I noticed a short pause—what were you thinking through just now?
+Good question: What were you watching for in the output after running that command?
+
+Bad questions (do not produce): "Why were you so slow?", "Did you mean to open that file?", "Can you explain everything you did in the last minute?"
+"""
+
+@lru_cache(maxsize=1024)
+def embed_text(text):
+    """Unit-length text-embedding-3-small vector (read-only; exact repeats skip the API)."""
+    resp = client.embeddings.create(model="text-embedding-3-small", input=text)
+    vec = np.asarray(resp.data[0].embedding, dtype=np.float32)
+    vec /= np.linalg.norm(vec)
+    vec.setflags(write=False)
+    return vec
+
+class SemanticCache:
+    """Bounded in-memory store of (embedding, question) pairs.
+    lookup() returns the most similar cached question with cosine
+    similarity >= threshold with the query, skipping every question
+    already asked in this task (asked), else None. Cleared per task."""
+    def __init__(self, threshold=0.92, maxlen=1000):
+        self.threshold = threshold
+        self.vecs      = deque(maxlen=maxlen)
+        self.questions = deque(maxlen=maxlen)
+        self.asked     = set()
+
+    def lookup(self, vec):
+        if not self.vecs:
+            return None
+        sims = np.stack(self.vecs) @ vec   # vectors are unit length: dot == cosine
+        for i in np.argsort(sims)[::-1]:
+            if sims[i] < self.threshold:
+                break
+            if self.questions[i] not in self.asked:
+                return self.questions[i]
+        return None
+
+    def add(self, vec, question):
+        self.vecs.append(vec); self.questions.append(question)
+
+    def clear(self):
+        self.vecs.clear(); self.questions.clear(); self.asked.clear()
+
+question_cache = SemanticCache()
+
 def llm_generate_question(prompt_hint, context_lines):
-    system = (
-        "You are an expert CTA interviewer. Ask ONE concise question "
-        "to reveal the user's hidden cues/decision-making, given context."
-    )
+    # Semantic cache: key on the hint + last 10 events, timestamps stripped
+    # (they would make every key unique); a cache failure just falls through to the LLM
+    key = "\n".join([prompt_hint, *(ln.split("  ", 1)[-1] for ln in context_lines[-10:])])
+    try:
+        key_vec = embed_text(key)
+        cached = question_cache.lookup(key_vec)
+        if cached is not None:
+            question_cache.asked.add(cached)
+            return cached
+    except Exception:
+        key_vec = None
+
+    # Dynamic part only; the section header lives in CTA_SYSTEM_PROMPT
     user_msg = "\n".join(
-        ["Context (last 60 s, most recent last):", *context_lines[-40:], "", f"Suggested focus: {prompt_hint}"]
+        [*context_lines[-40:], "", f"Suggested focus: {prompt_hint}"]
     )
 
     completion = client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[
-            {"role": "system", "content": system},
+            {"role": "system", "content": CTA_SYSTEM_PROMPT},
             {"role": "user", "content": user_msg},
         ],
         temperature=0.4,
     )
-    return completion.choices[0].message.content.strip()
+    question = completion.choices[0].message.content.strip()
+    if key_vec is not None:
+        question_cache.add(key_vec, question)
+    question_cache.asked.add(question)
+    return question
 
-def record_audio(fn, seconds=10, fs=16000):
+def record_audio(seconds=10, fs=16000):
+    """Record from the default mic; returns an in-memory WAV file (no disk I/O)."""
     msgbox = messagebox.showinfo
     msgbox("Recording", "Speak now…")
     audio = sd.rec(int(seconds*fs), samplerate=fs, channels=1)
     sd.wait()
-    sf.write(fn, audio, fs)
+    buf = io.BytesIO()
+    sf.write(buf, audio, fs, format="WAV")
+    buf.seek(0); buf.name = "ans.wav"   # the API infers the format from the name
     msgbox("Done", "Recording finished.")
+    return buf
 
-def transcribe_audio(fn):
-    with open(fn, "rb") as f:
-        transcription = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=f,
-            # response_format="text",  # optional, default is JSON with .text
-        )
+def transcribe_audio(wav):
+    transcription = client.audio.transcriptions.create(
+        model="whisper-1",
+        file=wav,
+        # response_format="text",  # optional, default is JSON with .text
+    )
     return transcription.text
 
 # ──────────────────────────  GUI  ────────────────────────────── #
@@ -170,6 +345,7 @@ class CTAGUI(tk.Tk):
 
     def start_task(self):
         self.stop_event.clear(); self.start_time = time.time()
+        question_cache.clear()   # don't serve questions from a previous task
         for target in (poll_active_window, hook_input,
                        lambda t,s: watch_fs(os.getcwd(), t, s)):
             th = threading.Thread(target=target, args=(self.telemetry, self.stop_event),
@@ -197,10 +373,7 @@ class CTAGUI(tk.Tk):
     def ask_cta_question(self, question, ctx):
         answer = None
         if messagebox.askyesno("CTA", f"{question}\n\nRecord answer?"):
-            wav_fn = f"ans_{int(time.time())}.wav"
-            record_audio(wav_fn, seconds=12)
-            answer = transcribe_audio(wav_fn)
-            os.remove(wav_fn)
+            answer = transcribe_audio(record_audio(seconds=12))
         # Store Q&A + context
         with open("cta_log.jsonl","a",encoding="utf8") as f:
             json.dump({"ts":datetime.now().isoformat(),
@@ -4,32 +4,107 @@ import numpy as np
 import datetime
 import time
 
+# MediaPipe Tasks selfie segmenter model, used for the GPU delegate
+# (download selfie_segmenter_landscape.tflite from the MediaPipe model page)
+SEG_MODEL_PATH = 'selfie_segmenter_landscape.tflite'
+
 # Initialize MediaPipe Selfie Segmentation
-mp_selfie_segmentation = mp.solutions.selfie_segmentation
-segmentor = mp_selfie_segmentation.SelfieSegmentation(model_selection=1)  # 1 for landscape mode, better for webcam
+# Prefer the Tasks ImageSegmenter on the GPU delegate; fall back to the CPU (TFLite) solution
+# when the model file is missing or the GPU delegate is unavailable (e.g. on Windows)
+# Returns (segment, backend) where segment(rgb_frame) gives the probability mask or None;
+# on fallback, backend includes the reason the GPU path wasn't used
+def create_segmentor():
+    try:
+        from mediapipe.tasks import python as mp_tasks
+        from mediapipe.tasks.python import vision
+        options = vision.ImageSegmenterOptions(
+            base_options=mp_tasks.BaseOptions(model_asset_path=SEG_MODEL_PATH,
+                                              delegate=mp_tasks.BaseOptions.Delegate.GPU),
+            running_mode=vision.RunningMode.IMAGE,
+            output_confidence_masks=True,
+            output_category_mask=False)
+        gpu_segmentor = vision.ImageSegmenter.create_from_options(options)
+        
+        def segment(rgb_frame):
+            result = gpu_segmentor.segment(mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame))
+            if not result.confidence_masks:
+                return None
+            # One confidence mask per category (0 = background, 1 = person); the person mask is last
+            return np.array(result.confidence_masks[-1].numpy_view())  # Copy out of MediaPipe-owned memory
+        
+        return segment, 'GPU'
+    except Exception as e:
+        mp_selfie_segmentation = mp.solutions.selfie_segmentation
+        segmentor = mp_selfie_segmentation.SelfieSegmentation(model_selection=1)  # 1 for landscape mode, better for webcam
+        return (lambda rgb_frame: segmentor.process(rgb_frame).segmentation_mask), f'CPU (GPU path unavailable: {type(e).__name__}: {e})'
 
-# Function to detect if a human is present using segmentation
-def detect_human(frame):
-    # Process the frame with MediaPipe
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = segmentor.process(rgb_frame)
+segment, SEG_BACKEND = create_segmentor()
+
+# Green overlay color (BGR), allocated once and broadcast over the frame
+GREEN = np.array([0, 255, 0], dtype=np.uint8)
+
+# Segmentation input size (matches the landscape model's native 256x144 input)
+SEG_SIZE = (256, 144)
+
+# Green-tint compositing: out = GREEN where mask > 0.5, else frame (all uint8, out preallocated)
+# NumPy version, used when numba isn't installed
+def blend_green_numpy(frame, mask, out):
+    np.copyto(out, frame)
+    np.copyto(out, GREEN, where=(mask > 0.5)[:, :, np.newaxis])
+    return out
+
+# Numba version: threshold + select fused into one parallel pass over the rows, no temporaries
+try:
+    from numba import njit, prange
     
-    if results.segmentation_mask is None:
-        return False
+    @njit(parallel=True, cache=True)
+    def blend_green(frame, mask, out):
+        for y in prange(frame.shape[0]):
+            for x in range(frame.shape[1]):
+                if mask[y, x] > 0.5:
+                    for c in range(3):
+                        out[y, x, c] = GREEN[c]
+                else:
+                    for c in range(3):
+                        out[y, x, c] = frame[y, x, c]
+        return out
     
-    # Get the segmentation mask (probability map)
-    mask = results.segmentation_mask
+    # Warm up at startup so the first frame doesn't pay the compile cost
+    blend_green(np.zeros((2, 2, 3), np.uint8), np.zeros((2, 2), np.float32), np.empty((2, 2, 3), np.uint8))
+except ImportError:
+    blend_green = blend_green_numpy
+
+# Preallocate per-frame work buffers (sized from the first frame) so the loop doesn't allocate
+def alloc_buffers(frame):
+    h, w = frame.shape[:2]
+    return {
+        'small': np.empty((SEG_SIZE[1], SEG_SIZE[0], 3), np.uint8),
+        'rgb': np.empty((SEG_SIZE[1], SEG_SIZE[0], 3), np.uint8),
+        'mask': np.empty((h, w), np.float32),
+        'segmented': np.empty_like(frame),
+    }
+
+# Function to detect if a human is present using segmentation
+# Returns (is_present, mask) so the caller can reuse the mask for visualization
+# Note: the mask is at SEG_SIZE resolution, not the frame's
+def detect_human(frame, buffers=None):
+    if buffers is None:
+        buffers = alloc_buffers(frame)
+    # Downscale before segmenting (and before the color conversion); the proportion check is scale-invariant
+    small = cv2.resize(frame, SEG_SIZE, dst=buffers['small'], interpolation=cv2.INTER_AREA)
+    rgb_frame = cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=buffers['rgb'])
     
-    # Threshold the mask to binary (human foreground if > 0.5)
-    binary_mask = (mask > 0.5).astype(np.uint8)
+    # Get the segmentation mask (probability map)
+    mask = segment(rgb_frame)
     
-    # Calculate the proportion of human pixels
-    human_pixels = np.sum(binary_mask)
-    total_pixels = binary_mask.size
-    proportion = human_pixels / total_pixels
+    if mask is None:
+        return False, None
     
-    # Return True if human proportion is above a threshold (e.g., 5% of frame)
-    return proportion > 0.05  # Adjust based on your setup; lower for sensitivity
+    # Minimum number of human pixels (e.g., 5% of frame)
+    threshold_pixels = 0.05 * mask.size  # Adjust based on your setup; lower for sensitivity
+
+    # Count foreground pixels (> 0.5) in one pass, no uint8 copy of the mask
+    return np.count_nonzero(mask > 0.5) > threshold_pixels, mask
 
 # Main function to handle webcam capture and logging
 def main():
@@ -49,7 +124,9 @@ def main():
     presence_counter = 0
     absence_counter = 0
     
-    print("Starting webcam human detection (using MediaPipe Selfie Segmentation). Press 'q' to quit.")
+    buffers = None
+    
+    print(f"Starting webcam human detection (using MediaPipe Selfie Segmentation on {SEG_BACKEND}). Press 'q' to quit.")
     
     while True:
         # Capture frame-by-frame
@@ -59,8 +136,11 @@ def main():
             print("Error: Failed to capture frame.")
             break
         
+        if buffers is None:
+            buffers = alloc_buffers(frame)
+        
         # Detect human in the current frame
-        is_human_detected = detect_human(frame)
+        is_human_detected, mask = detect_human(frame, buffers)
         
         # Update counters
         if is_human_detected:
@@ -85,14 +165,10 @@ def main():
             status = "present" if human_present else "not present"
             print(f"{current_time}: Human is {status}")
         
-        # For visualization: Apply green tint to human segmentation
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = segmentor.process(rgb_frame)
-        if results.segmentation_mask is not None:
-            mask = (results.segmentation_mask > 0.5)[:, :, np.newaxis].astype(np.uint8)
-            green_bg = np.zeros_like(frame) + [0, 255, 0]  # Green overlay
-            segmented = frame * (1 - mask) + green_bg * mask
-            segmented = segmented.astype(np.uint8)  # Ensure uint8 for cv2.imshow
+        # For visualization: Apply green tint to human segmentation (reuses the detection mask)
+        if mask is not None:
+            mask = cv2.resize(mask, (frame.shape[1], frame.shape[0]), dst=buffers['mask'], interpolation=cv2.INTER_LINEAR)
+            segmented = blend_green(frame, mask, buffers['segmented'])  # Stays uint8 for cv2.imshow
             cv2.imshow('Webcam - Human Detection', segmented)
         else:
             cv2.imshow('Webcam - Human Detection', frame)
@@ -1,10 +1,12 @@
 import json
 import os
+import queue
 import time
 import datetime
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import pygetwindow as gw
-import pyautogui
+from mss import mss
 import pynput
 import psutil
 import pyperclip
@@ -14,31 +16,86 @@ from PIL import Image
 
 # Directories and files
 LOG_FILE = 'session_log.jsonl'
+LOG_BATCH_SIZE = 64  # Max lines written per batch by the log writer thread
 SCREENSHOT_DIR = 'screenshots'
+SCREENSHOT_JPEG_QUALITY = 80
+SCREENSHOT_INTERVAL = 1.0  # Min seconds between click captures; clicks in between reuse the last click screenshot
 os.makedirs(SCREENSHOT_DIR, exist_ok=True)
 
 # Global variables for tracking
 current_window = None
 window_start_time = None
 last_clipboard = pyperclip.paste()
+last_screenshot_time = 0.0
+last_screenshot_path = None
+screenshot_lock = threading.Lock()  # Guards last_screenshot_* (mouse listener + tracker threads)
 
-# Function to log to JSONL
+# Set on shutdown to stop periodic_tracker (before the screenshot encoder is shut down)
+tracker_stop = threading.Event()
+
+# Per-thread mss handle (mss instances must not be shared across threads)
+screen_capture = threading.local()
+
+# Screenshot encoder pool (keeps JPEG encode + disk write off the listener threads)
+screenshot_encoder = ThreadPoolExecutor(max_workers=2)
+
+# Serialized log lines waiting for the log writer thread
+log_queue = queue.Queue()
+
+# Function to log to JSONL (serializes here, the write happens on the log writer thread)
 def log_entry(entry):
-    with open(LOG_FILE, 'a') as f:
-        f.write(json.dumps(entry) + '\n')
+    log_queue.put(json.dumps(entry) + '\n')
+
+# Log writer thread: writes queued lines to the already-open log file f in batches
+def log_writer(f):
+    while True:
+        batch = [log_queue.get()]
+        while len(batch) < LOG_BATCH_SIZE:
+            try:
+                batch.append(log_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            f.write(''.join(batch))
+            f.flush()
+        except Exception as e:
+            # Report and keep draining, so log_entry callers and log_queue.join() never hang
+            print(f"Error: Failed to write {len(batch)} log entries to {LOG_FILE}: {e}")
+        finally:
+            for _ in batch:
+                log_queue.task_done()
 
 # Function to get current timestamp
 def get_timestamp():
     return datetime.datetime.now().isoformat()
 
+# Process names cached per (hWnd, pid), so a reused PID (new window) is looked up again
+# On each focus change, prune_process_names drops every window except the new active one
+process_names = {}
+
+# Function to get a window's process name (cached)
+def get_process_name(hwnd, pid):
+    key = (hwnd, pid)
+    name = process_names.get(key)
+    if name is None:
+        name = psutil.Process(pid).name()
+        process_names[key] = name
+    return name
+
+# Function to drop cached process names of every window except active_window
+# (also covers windows that gained and lost focus between tracker ticks)
+def prune_process_names(active_window):
+    keep = active_window._hWnd if active_window is not None else None
+    for key in [k for k in list(process_names) if k[0] != keep]:  # Snapshot; listeners may insert
+        process_names.pop(key, None)
+
 # Function to get window details
 def get_window_details(window):
     if window is None:
         return None
     try:
         pid = gw.getWindowThreadProcessId(window._hWnd)[1]  # For Windows
-        process = psutil.Process(pid)
-        process_name = process.name()
+        process_name = get_process_name(window._hWnd, pid)
         bounds = (window.left, window.top, window.width, window.height)
         # App metadata: For browsers, try to extract URL from title (simple)
         metadata = {}
@@ -57,18 +114,47 @@ def get_window_details(window):
     except Exception as e:
         return {'error': str(e)}
 
+# Function to capture the screen and queue the encode; returns the path
+def capture_screenshot(highlight_pos=None):
+    if not hasattr(screen_capture, 'sct'):
+        screen_capture.sct = mss()
+    sct = screen_capture.sct
+    raw = sct.grab(sct.monitors[1])  # Primary monitor, BGRA
+    bgra = np.frombuffer(raw.bgra, dtype=np.uint8).reshape(raw.height, raw.width, 4)
+    img = np.ascontiguousarray(bgra[:, :, :3])  # Drop alpha; writable BGR for drawing
+    if highlight_pos:
+        x, y = highlight_pos
+        cv2.circle(img, (x, y), 20, (0, 0, 255), 2)  # Red circle for click
+    ts = get_timestamp().replace(':', '-')
+    path = os.path.join(SCREENSHOT_DIR, f'screenshot_{ts}.jpg')
+    future = screenshot_encoder.submit(cv2.imwrite, path, img, [cv2.IMWRITE_JPEG_QUALITY, SCREENSHOT_JPEG_QUALITY])
+    future.add_done_callback(lambda f: report_screenshot_write(f, path))
+    return path
+
+# Encoder done-callback: report screenshots that were logged but never written
+def report_screenshot_write(future, path):
+    try:
+        if not future.result():
+            print(f"Error: Failed to write screenshot {path}")
+    except Exception as e:
+        print(f"Error: Failed to write screenshot {path}: {e}")
+
 # Function to take screenshot with optional highlight
-def take_screenshot(highlight_pos=None):
+# Returns the path immediately; the file is written asynchronously by screenshot_encoder
+# With rate_limited=True (click bursts), captures at most once per SCREENSHOT_INTERVAL and
+# returns the last rate-limited path in between; other calls always capture
+def take_screenshot(highlight_pos=None, rate_limited=False):
+    global last_screenshot_time, last_screenshot_path
     try:
-        screenshot = pyautogui.screenshot()
-        img = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-        if highlight_pos:
-            x, y = highlight_pos
-            cv2.circle(img, (x, y), 20, (0, 0, 255), 2)  # Red circle for click
-        ts = get_timestamp().replace(':', '-')
-        path = os.path.join(SCREENSHOT_DIR, f'screenshot_{ts}.png')
-        cv2.imwrite(path, img)
-        return path
+        if not rate_limited:
+            return capture_screenshot(highlight_pos)
+        with screenshot_lock:
+            now = time.time()
+            if last_screenshot_path and now - last_screenshot_time < SCREENSHOT_INTERVAL:
+                return last_screenshot_path
+            last_screenshot_path = capture_screenshot(highlight_pos)
+            last_screenshot_time = now
+            return last_screenshot_path
     except Exception as e:
         return str(e)
 
@@ -77,7 +163,7 @@ def on_click(x, y, button, pressed):
     if pressed:
         ts = get_timestamp()
         window_details = get_window_details(gw.getActiveWindow())
-        screenshot_path = take_screenshot((x, y))
+        screenshot_path = take_screenshot((x, y), rate_limited=True)
         entry = {
             'timestamp': ts,
             'type': 'mouse_click',
@@ -123,7 +209,7 @@ def on_press(key):
 # Periodic tasks: Window tracking, clipboard, network (simple)
 def periodic_tracker():
     global current_window, window_start_time, last_clipboard
-    while True:
+    while not tracker_stop.is_set():
         active_window = gw.getActiveWindow()
         ts = get_timestamp()
         
@@ -156,6 +242,7 @@ def periodic_tracker():
             }
             log_entry(entry)
             
+            prune_process_names(active_window)
             current_window = active_window
             window_start_time = datetime.datetime.now()
         
@@ -185,12 +272,21 @@ def periodic_tracker():
             }
             log_entry(entry)
         
-        time.sleep(1)  # Check every second
+        tracker_stop.wait(1)  # Check every second
 
 # Main function
 def main():
     print("Starting monitoring. Press Ctrl+C to stop.")
     
+    # Open the log here so a bad path fails before anything is queued, then start the writer
+    try:
+        log_file = open(LOG_FILE, 'a', buffering=1 << 16)
+    except OSError as e:
+        print(f"Error: Could not open log file {LOG_FILE}: {e}")
+        return
+    writer_thread = threading.Thread(target=log_writer, args=(log_file,), daemon=True)
+    writer_thread.start()
+    
     # Start listeners
     mouse_listener = pynput.mouse.Listener(on_click=on_click, on_scroll=on_scroll, on_move=on_move)
     keyboard_listener = pynput.keyboard.Listener(on_press=on_press)
@@ -208,6 +304,11 @@ def main():
         print("Stopping monitoring.")
         mouse_listener.stop()
         keyboard_listener.stop()
+        # Stop everything that takes screenshots before shutting down the encoder
+        tracker_stop.set()
+        mouse_listener.join()
+        keyboard_listener.join()
+        tracker_thread.join()
         # Log final window time
         if current_window and window_start_time:
             ts = get_timestamp()
@@ -223,6 +324,10 @@ def main():
                 }
             }
             log_entry(entry)
+        # Wait for pending screenshots and queued log lines to reach disk
+        screenshot_encoder.shutdown(wait=True)
+        log_queue.join()
+        log_file.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
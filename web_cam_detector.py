@@ -1,49 +1,52 @@
 import cv2
+import numpy as np
+import os
 import datetime
 import time
 
-# Global cascade classifiers (loaded once)
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-profile_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_profileface.xml')
-lbp_profile_cascade = cv2.CascadeClassifier(cv2.data.lbpcascades + 'lbpcascade_profileface.xml')
-upperbody_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_upperbody.xml')
+# YuNet face detector model (int8-quantized ONNX, frontal + profile in one pass; OpenCV >= 4.8)
+YUNET_MODEL_PATH = 'face_detection_yunet_2023mar_int8.onnx'
+YUNET_MODEL_URL = 'https://github.com/opencv/opencv_zoo/tree/main/models/face_detection_yunet'
 
-# Function to detect if a human is present using multiple cascades
-def detect_human(frame):
-    # Convert frame to grayscale
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    # Equalize histogram for better contrast in varying lighting
-    gray = cv2.equalizeHist(gray)
-    
-    # Detect frontal faces
-    frontal_faces = face_cascade.detectMultiScale(gray, scaleFactor=1.05, minNeighbors=5, minSize=(30, 30))
-    
-    # Detect profile faces (Haar)
-    profile_faces = profile_cascade.detectMultiScale(gray, scaleFactor=1.05, minNeighbors=3, minSize=(30, 30))
-    
-    # Flip the image horizontally and detect profile on the other side (Haar)
-    flipped_gray = cv2.flip(gray, 1)
-    profile_faces_flipped = profile_cascade.detectMultiScale(flipped_gray, scaleFactor=1.05, minNeighbors=3, minSize=(30, 30))
-    
-    # Detect profile faces (LBP)
-    lbp_profile_faces = lbp_profile_cascade.detectMultiScale(gray, scaleFactor=1.05, minNeighbors=3, minSize=(30, 30))
-    
-    # Flip and detect LBP profile on the other side
-    lbp_profile_faces_flipped = lbp_profile_cascade.detectMultiScale(flipped_gray, scaleFactor=1.05, minNeighbors=3, minSize=(30, 30))
-    
-    # Detect upper body as fallback
-    upper_bodies = upperbody_cascade.detectMultiScale(gray, scaleFactor=1.05, minNeighbors=3, minSize=(60, 60))
+# Detection runs on a frame downscaled by this factor (~4x fewer pixels at 2)
+DETECT_SCALE = 2
+
+# Map rectangles from the downscaled detection image back to frame coordinates
+def to_frame_coords(rects):
+    return [(x * DETECT_SCALE, y * DETECT_SCALE, w * DETECT_SCALE, h * DETECT_SCALE) for (x, y, w, h) in rects]
+
+# Preallocate per-frame work buffers (sized from the first frame) so the loop doesn't allocate
+# Also sets the detector's input size to match
+def alloc_buffers(frame, face_detector):
+    h, w = frame.shape[:2]
+    small = np.empty((h // DETECT_SCALE, w // DETECT_SCALE, 3), np.uint8)
+    face_detector.setInputSize((small.shape[1], small.shape[0]))
+    return {'small': small}
+
+# Function to detect if a human is present using the YuNet face detector
+# Returns (is_present, faces) so the caller can draw the rectangles without re-running detection
+# Rectangles are (x, y, w, h) at detection scale (see to_frame_coords)
+def detect_human(frame, face_detector, buffers=None):
+    if buffers is None:
+        buffers = alloc_buffers(frame, face_detector)
+    # Downscale for the detector
+    small = buffers['small']
+    small = cv2.resize(frame, (small.shape[1], small.shape[0]), dst=small, interpolation=cv2.INTER_AREA)
     
-    # Return True if any detection is found
-    return (len(frontal_faces) > 0 or 
-            len(profile_faces) > 0 or 
-            len(profile_faces_flipped) > 0 or 
-            len(lbp_profile_faces) > 0 or 
-            len(lbp_profile_faces_flipped) > 0 or 
-            len(upper_bodies) > 0)
+    # Detect faces: Nx15 rows of box, 5 landmarks and score (None if no faces)
+    _, faces = face_detector.detect(small)
+    if faces is None:
+        return False, []
+    return True, faces[:, :4].astype(int).tolist()
 
 # Main function to handle webcam capture and logging
 def main():
+    # Load the face detector (model file is not shipped with the repo)
+    if not os.path.exists(YUNET_MODEL_PATH):
+        print(f"Error: Face detector model '{YUNET_MODEL_PATH}' not found. Download it from {YUNET_MODEL_URL}")
+        return
+    face_detector = cv2.FaceDetectorYN_create(YUNET_MODEL_PATH, '', (320, 320), score_threshold=0.6)
+    
     # Open the webcam (0 for default camera)
     cap = cv2.VideoCapture(0)
     
@@ -60,7 +63,9 @@ def main():
     presence_counter = 0
     absence_counter = 0
     
-    print("Starting webcam human detection (enhanced multi-cascade with LBP and equalization). Press 'q' to quit.")
+    buffers = None
+    
+    print("Starting webcam human detection (YuNet face detector). Press 'q' to quit.")
     
     while True:
         # Capture frame-by-frame
@@ -70,8 +75,11 @@ def main():
             print("Error: Failed to capture frame.")
             break
         
+        if buffers is None:
+            buffers = alloc_buffers(frame, face_detector)
+        
         # Detect human in the current frame
-        is_human_detected = detect_human(frame)
+        is_human_detected, faces = detect_human(frame, face_detector, buffers)
         
         # Update counters based on detection
         if is_human_detected:
@@ -96,43 +104,11 @@ def main():
             status = "present" if human_present else "not present"
             print(f"{current_time}: Human is {status}")
         
-        # For visualization: Draw bounding boxes for all detections
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.equalizeHist(gray)
-        flipped_gray = cv2.flip(gray, 1)
-        
-        # Frontal faces (blue)
-        frontal_faces = face_cascade.detectMultiScale(gray, scaleFactor=1.05, minNeighbors=5, minSize=(30, 30))
-        for (x, y, w, h) in frontal_faces:
+        # For visualization: Draw bounding boxes for all detections (reuses detect_human results)
+        # Faces (blue)
+        for (x, y, w, h) in to_frame_coords(faces):
             cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
         
-        # Haar Profile faces (green)
-        profile_faces = profile_cascade.detectMultiScale(gray, scaleFactor=1.05, minNeighbors=3, minSize=(30, 30))
-        for (x, y, w, h) in profile_faces:
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-        
-        # Haar Profile faces on flipped (green)
-        profile_faces_flipped = profile_cascade.detectMultiScale(flipped_gray, scaleFactor=1.05, minNeighbors=3, minSize=(30, 30))
-        for (x, y, w, h) in profile_faces_flipped:
-            adj_x = frame.shape[1] - (x + w)
-            cv2.rectangle(frame, (adj_x, y), (adj_x + w, y + h), (0, 255, 0), 2)
-        
-        # LBP Profile faces (yellow)
-        lbp_profile_faces = lbp_profile_cascade.detectMultiScale(gray, scaleFactor=1.05, minNeighbors=3, minSize=(30, 30))
-        for (x, y, w, h) in lbp_profile_faces:
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 255), 2)
-        
-        # LBP Profile faces on flipped (yellow)
-        lbp_profile_faces_flipped = lbp_profile_cascade.detectMultiScale(flipped_gray, scaleFactor=1.05, minNeighbors=3, minSize=(30, 30))
-        for (x, y, w, h) in lbp_profile_faces_flipped:
-            adj_x = frame.shape[1] - (x + w)
-            cv2.rectangle(frame, (adj_x, y), (adj_x + w, y + h), (0, 255, 255), 2)
-        
-        # Upper bodies (red)
-        upper_bodies = upperbody_cascade.detectMultiScale(gray, scaleFactor=1.05, minNeighbors=3, minSize=(60, 60))
-        for (x, y, w, h) in upper_bodies:
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
-        
         # Display the resulting frame
         cv2.imshow('Webcam - Human Detection', frame)
         